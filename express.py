@@ -1,94 +1,236 @@
+from functools import lru_cache, wraps
+from keyword import iskeyword
+import operator
+from weakref import WeakValueDictionary
 import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def express(obj):
     if isinstance(obj, Expression):
         return obj
-    elif isinstance(obj, (list, tuple)):
+    elif isinstance(obj, (list, tuple, np.ndarray)):
         return Tensor(obj)
     elif isinstance(obj, str):
         objs = obj.split()
         if len(objs) > 1:
-            return [Symbol(o) for o in objs]
+            return [_express_atom(o) for o in objs]
         elif len(objs) == 1:
-            return Symbol(objs[0])
+            return _express_atom(objs[0])
     elif isinstance(obj, (int, float)):
-        return Number(obj)
+        return _express_atom(obj)
     raise TypeError(f'cannot express {type(obj)}')
 
 
+@lru_cache(maxsize=4096, typed=True)
+def _express_atom(obj):
+    if isinstance(obj, str):
+        return Symbol(obj)
+    return Number(obj)
+
+
+def cached_diff(diff):
+
+    @wraps(diff)
+    def wrapper(self, wrt):
+        if not isinstance(wrt, Symbol):
+            return diff(self, wrt)
+        cache = getattr(self, '_diff_cache', None)
+        if cache is None:
+            cache = self._diff_cache = WeakValueDictionary()
+        deriv = cache.get(wrt.name)
+        if deriv is None:
+            deriv = cache[wrt.name] = diff(self, wrt)
+        return deriv
+
+    return wrapper
+
+
+def cached_repr(repr):
+
+    @wraps(repr)
+    def wrapper(self):
+        cache = getattr(self, '_repr_cache', None)
+        if cache is None:
+            cache = self._repr_cache = repr(self)
+        return cache
+
+    return wrapper
+
+
+_interned = WeakValueDictionary()
+
+
+def _intern(cls, args):
+    key = (cls,) + tuple(map(id, args))
+    node = _interned.get(key)
+    if node is None:
+        node = object.__new__(cls)
+        _interned[key] = node
+    return node
+
+
+def _leaves(cls, args):
+    # operands of a chain of cls nodes, however it is nested
+    stack = list(reversed(args))
+    while stack:
+        arg = stack.pop()
+        if type(arg) is cls:
+            stack.extend(reversed(arg.args))
+        else:
+            yield arg
+
+
+def _make(cls, args):
+    # products from Multiply.diff stay binary so that their chains are
+    # shared, but every node is interned by its flattened operands, so
+    # (x1*x2)*x3 and x1*x2*x3 are one node whichever is built first
+    key = [cls]
+    for arg in args:
+        if type(arg) is cls:
+            key.extend(arg._key[1:])
+        else:
+            key.append(id(arg))
+    key = tuple(key)
+    node = _interned.get(key)
+    if node is None:
+        node = object.__new__(cls)
+        node.args, node._key = tuple(args), key
+        _interned[key] = node
+    return node
+
+
+def _product(a, b):
+    if a._kind or b._kind:
+        return a * b
+    elif a == 0 or b == 0:
+        return _ZERO
+    elif a == 1:
+        return b
+    elif b == 1:
+        return a
+    return _make(Multiply, (a, b))
+
+
+def _flatten(cls, args, op):
+    flat, pos, count = [], None, 0
+    for arg in map(express, args):
+        for a in _leaves(cls, (arg,)):
+            if not isinstance(a, Number):
+                flat.append(a)
+            elif pos is None:
+                pos, value, count = len(flat), a.value, 1
+                flat.append(a)
+            else:
+                value, count = op(value, a.value), count + 1
+    if count > 1:
+        flat[pos] = Number(value)
+    return flat, pos, value if count else None
+
+
 class Expression(object):
 
+    __slots__ = (
+        'args', '_diff_cache', '_repr_cache', '_tapes', '_lambdas',
+        '__weakref__',
+    )
+    _kind = 0
+
     def __init__(self, *args):
         self.args = args
 
+    @cached_repr
     def __repr__(self):
         type_name = type(self).__name__
         arg_reprs = map(repr, self.args)
         return f'{type_name}({", ".join(arg_reprs)})'
 
+    def __reduce__(self):
+        return type(self), self.args
+
     def __neg__(self):
         if self == 0:
             return self
         elif isinstance(self, Tensor):
-            return Tensor([-a for a in self])
+            return Tensor._wrap(-self.args)
         return Negative(self)
 
     def __add__(self, other):
-        if other == 0:
-            return self
-        elif self == 0:
-            return other
-        elif isinstance(self, Tensor) and isinstance(other, Tensor):
-            same_shape = self.shape == other.shape
-            assert same_shape, 'cannot add tensors of different shapes'
-            return Tensor([a + b for a, b in zip(self, other)])
-        elif isinstance(self, Tensor):
-            return Tensor([a + other for a in self])
-        elif isinstance(other, Tensor):
-            return Tensor([self + b for b in other])
-        return Add(self, other)
+        kinds = self._kind, getattr(other, '_kind', 0)
+        return _ADD_DISPATCH[kinds](self, other)
 
     def __radd__(self, other):
-        return Expression.__add__(other, self)
+        return _ADD_DISPATCH[0, self._kind](other, self)
 
     def __sub__(self, other):
-        if isinstance(self, Tensor) and isinstance(other, Tensor):
-            same_shape = self.shape == other.shape
-            assert same_shape, 'cannot subtract tensors of different shapes'
-            return Tensor([a - b for a, b in zip(self, other)])
-        elif isinstance(self, Tensor):
-            return Tensor([a - other for a in self])
-        elif isinstance(other, Tensor):
-            return Tensor([self - b for b in other])
-        return Add(self, -other)
+        kinds = self._kind, getattr(other, '_kind', 0)
+        return _SUB_DISPATCH[kinds](self, other)
 
     def __rsub__(self, other):
-        return Expression.__sub__(other, self)
+        return _SUB_DISPATCH[0, self._kind](other, self)
 
     def __mul__(self, other):
-        both_tensors = isinstance(self, Tensor) and isinstance(other, Tensor)
-        assert not both_tensors, 'cannot multiply two tensors'
-        if other == 1:
-            return self
-        elif self == 1:
-            return other
-        elif isinstance(self, Tensor):
-            return Tensor([a * other for a in self])
-        elif isinstance(other, Tensor):
-            return Tensor([self * a for a in other])
-        elif other == 0:
-            return other
-        elif self == 0:
-            return self
-        return Multiply(self, other)
+        kinds = self._kind, getattr(other, '_kind', 0)
+        return _MUL_DISPATCH[kinds](self, other)
 
     def __rmul__(self, other):
-        return Expression.__mul__(other, self)
+        return _MUL_DISPATCH[0, self._kind](other, self)
+
+    def eval(self, **vars):
+        return self._eval(vars)
 
     def asarray(self):
         return self
 
+    def bind(self, names):
+        return Bound(self, names)
+
+    def compile(self, var_order):
+        key = tuple(var_order)
+        tapes = getattr(self, '_tapes', None)
+        if tapes is None:
+            tapes = self._tapes = {}
+        if key not in tapes:
+            tapes[key] = Tape(self, key)
+        return tapes[key]
+
+    def _emit(self, tape):
+        raise TypeError(f'cannot compile {type(self).__name__}')
+
+    def _recorded(self, env, slots, tape, index):
+        key = id(self)
+        if key not in index:
+            index[key] = (self, self._record(env, slots, tape, index))
+        return index[key][1]
+
+    def _record(self, env, slots, tape, index):
+        raise TypeError(f'cannot record {type(self).__name__}')
+
+    def to_source(self, var_names, backend='numba'):
+        return str(_Source(self, var_names, backend))
+
+    def lambdify(self, var_names, backend='numba'):
+        key = (tuple(var_names), backend)
+        funcs = getattr(self, '_lambdas', None)
+        if funcs is None:
+            funcs = self._lambdas = {}
+        if key not in funcs:
+            namespace = {'np': np}
+            exec(self.to_source(*key), namespace)
+            func = namespace['_f']
+            if backend == 'numba' and numba is not None:
+                # no fastmath: it assumes finite values, so nan/inf
+                # constants and inputs would give undefined results
+                func = numba.njit(func)
+            funcs[key] = func
+        return funcs[key]
+
+    def _source(self, src):
+        raise TypeError(f'cannot lambdify {type(self).__name__}')
+
     @property
     def order(self):
         return 0
@@ -107,7 +249,9 @@ class Expression(object):
             return Tensor([a.inner(other) for a in self])
         elif other.order > 1:
             return Tensor([self.inner(b) for b in other])
-        return Add(*[a * b for a, b in zip(self, other)])
+        assert self.shape == other.shape, \
+            'cannot take inner product of tensors of different shapes'
+        return Add(*(self.args * other.args))
 
     def outer(self, other):
         both_tensors = isinstance(self, Tensor) and isinstance(other, Tensor)
@@ -115,20 +259,46 @@ class Expression(object):
             return self * other
         elif self.order > 1 or other.order > 1:
             raise NotImplementedError
-        return Tensor([Tensor([a * b for b in other]) for a in self])
+        return Tensor._wrap(np.multiply.outer(self.args, other.args))
+
+    def matmul(self, other):
+        both_tensors = isinstance(self, Tensor) and isinstance(other, Tensor)
+        assert both_tensors, 'cannot matmul non-tensors'
+        a = self.args.reshape(-1, self.shape[-1])
+        b = other.args.reshape(other.shape[0], -1)
+        assert a.shape[1] == b.shape[0], \
+            'cannot matmul tensors of incompatible shapes'
+        out = np.empty((a.shape[0], b.shape[1]), dtype=object)
+        for i in range(a.shape[0]):
+            for j in range(b.shape[1]):
+                out[i, j] = Add(*(a[i] * b[:, j]))
+        shape = self.shape[:-1] + other.shape[1:]
+        if not shape:
+            return out[0, 0]
+        return Tensor._wrap(out.reshape(shape))
+
+    def __matmul__(self, other):
+        return self.matmul(other)
 
     @property
     def T(self):
-        if self.order > 2:
-            return Tensor([a.T for a in self])
-        elif self.order == 2:
-            return Tensor(zip(*self.args))
-        else:
-            return self
+        if self.order > 1:
+            return Tensor._wrap(np.swapaxes(self.args, -1, -2))
+        return self
 
 
 class Number(Expression):
 
+    __slots__ = ('value',)
+
+    def __new__(cls, value):
+        if type(value) is int and value in (0, 1):
+            return (_ZERO, _ONE)[value]
+        return super().__new__(cls)
+
+    def __reduce__(self):
+        return type(self), (self.value,)
+
     def __init__(self, value):
         self.value = value
 
@@ -138,66 +308,192 @@ class Number(Expression):
     def __eq__(self, other):
         return self.value == other
 
-    def eval(self, **vars):
+    def __neg__(self):
+        return Number(-self.value)
+
+    def _eval(self, env):
         return self.value
 
+    def _eval_dual(self, env, slots, n_vars):
+        return self.value, np.zeros(n_vars)
+
+    def _record(self, env, slots, tape, index):
+        return self.value, tape.push(_LOAD_CONST)
+
+    def _emit(self, tape):
+        return tape.const(self.value)
+
+    def _source(self, src):
+        if isinstance(self.value, float) and np.isnan(self.value):
+            return 'np.nan'
+        elif isinstance(self.value, float) and np.isinf(self.value):
+            return '-np.inf' if self.value < 0 else 'np.inf'
+        return repr(self.value)
+
     def diff(self, wrt):
         if isinstance(wrt, Tensor):
-            return Tensor([self.diff(a) for a in wrt.args])
-        return Number(0)
+            return Tensor([self.diff(a) for a in wrt])
+        return _ZERO
+
+
+_ZERO = object.__new__(Number)
+_ZERO.value = 0
+
+_ONE = object.__new__(Number)
+_ONE.value = 1
 
 
 class Symbol(Expression):
 
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = str(name)
 
     def __repr__(self):
         return self.name
 
-    def eval(self, **vars):
-        return vars.get(self.name, self)
+    def __reduce__(self):
+        return type(self), (self.name,)
+
+    def _eval(self, env):
+        return env.get(self.name, self)
+
+    def _slot(self, slots):
+        slot = slots.get(self.name)
+        if slot is None:
+            raise ValueError(f'{self.name} is not bound')
+        return slot
+
+    def _eval_dual(self, env, slots, n_vars):
+        slot = self._slot(slots)
+        grad = np.zeros(n_vars)
+        grad[slot] = 1
+        return env[slot], grad
+
+    def _record(self, env, slots, tape, index):
+        slot = self._slot(slots)
+        return env[slot], tape.push(_LOAD_VAR, (slot,), (1.0,))
+
+    def _emit(self, tape):
+        if self.name in tape.var_order:
+            return tape.push(_LOAD_VAR, tape.var_order.index(self.name))
+        elif tape.partial:
+            return tape.const(self)
+        raise ValueError(f'{self.name} is not in var_order')
+
+    def _source(self, src):
+        if self.name not in src.var_names:
+            raise ValueError(f'{self.name} is not in var_names')
+        return self.name
 
+    @cached_diff
     def diff(self, wrt):
         if isinstance(wrt, Tensor):
-            return Tensor([self.diff(a) for a in wrt.args])
+            return Tensor([self.diff(a) for a in wrt])
         elif isinstance(wrt, Symbol):
             if wrt.name == self.name:
-                return Number(1)
+                return _ONE
         return Derivative(wrt, arg=self)
 
 
 class Negative(Expression):
 
+    __slots__ = ('arg',)
+
+    def __new__(cls, arg):
+        return _intern(cls, (arg,))
+
+    def __reduce__(self):
+        return type(self), (self.arg,)
+
     def __init__(self, arg):
         self.arg = arg
 
+    @cached_repr
     def __repr__(self):
         return f'-{repr(self.arg)}'
 
-    def eval(self, **vars):
-        return -self.arg.eval(**vars)
+    def _eval(self, env):
+        return -self.arg._eval(env)
+
+    def _eval_dual(self, env, slots, n_vars):
+        value, grad = self.arg._eval_dual(env, slots, n_vars)
+        return -value, -grad
+
+    def _record(self, env, slots, tape, index):
+        value, i = self.arg._recorded(env, slots, tape, index)
+        return -value, tape.push(_NEG, (i,), (-1.0,))
 
+    def _emit(self, tape):
+        return tape.push(_NEG, tape.emit(self.arg))
+
+    def _source(self, src):
+        return src.assign(f'-{src.emit(self.arg)}')
+
+    @cached_diff
     def diff(self, wrt):
         return -self.arg.diff(wrt)
 
 
 class Add(Expression):
 
+    __slots__ = ('_key',)
+
+    def __new__(cls, *args):
+        args, pos, value = _flatten(cls, args, operator.add)
+        if value == 0:
+            del args[pos]
+        if not args:
+            return _ZERO
+        elif len(args) == 1:
+            return args[0]
+        return _make(cls, args)
+
+    def __init__(self, *args):
+        pass
+
+    @cached_repr
     def __repr__(self):
         return '(' + ' + '.join(map(repr, self.args)) + ')'
 
-    def eval(self, **vars):
-        value = 0
-        for i, arg in enumerate(self.args):
-            if i == 0:
-                value = arg.eval(**vars)
-            else:
-                value += arg.eval(**vars)
+    def _eval(self, env):
+        first, *rest = self.args
+        value = first._eval(env)
+        for arg in rest:
+            value = value + arg._eval(env)
         return value
 
+    def _eval_dual(self, env, slots, n_vars):
+        value, grad = 0, np.zeros(n_vars)
+        for arg in self.args:
+            v, g = arg._eval_dual(env, slots, n_vars)
+            value = value + v
+            grad = grad + g
+        return value, grad
+
+    def _record(self, env, slots, tape, index):
+        values, inputs = zip(*[
+            express(a)._recorded(env, slots, tape, index) for a in self.args
+        ])
+        return sum(values), tape.push(_ADD, inputs, (1.0,) * len(inputs))
+
+    def _emit(self, tape):
+        if not self.args:
+            return tape.emit(_ZERO)
+        out, *rest = [tape.emit(a) for a in self.args]
+        for b in rest:
+            out = tape.push(_ADD, out, b)
+        return out
+
+    def _source(self, src):
+        if not self.args:
+            return src.emit(_ZERO)
+        return src.assign(' + '.join(src.emit(a) for a in self.args))
+
+    @cached_diff
     def diff(self, wrt):
-        deriv = Number(0)
+        deriv = _ZERO
         for i, arg in enumerate(self.args):
             if i == 0:
                 deriv = arg.diff(wrt)
@@ -208,25 +504,81 @@ class Add(Expression):
 
 class Multiply(Expression):
 
+    __slots__ = ('_key',)
+
+    def __new__(cls, *args):
+        args, pos, value = _flatten(cls, args, operator.mul)
+        if value == 0:
+            return _ZERO
+        elif value == 1:
+            del args[pos]
+        if not args:
+            return _ONE
+        elif len(args) == 1:
+            return args[0]
+        return _make(cls, args)
+
+    def __init__(self, *args):
+        pass
+
+    @cached_repr
     def __repr__(self):
         return ''.join(map(repr, self.args))
     
-    def eval(self, **vars):
-        value = 1
-        for i, arg in enumerate(self.args):
-            if i == 0:
-                value = arg.eval(**vars)
-            else:
-                value *= arg.eval(**vars)
+    def _eval(self, env):
+        first, *rest = self.args
+        value = first._eval(env)
+        for arg in rest:
+            value = value * arg._eval(env)
         return value
 
+    def _eval_dual(self, env, slots, n_vars):
+        value, grad = 1, np.zeros(n_vars)
+        for arg in self.args:
+            v, g = arg._eval_dual(env, slots, n_vars)
+            grad = value * g + v * grad
+            value = value * v
+        return value, grad
+
+    def _record(self, env, slots, tape, index):
+        values, inputs = zip(*[
+            express(a)._recorded(env, slots, tape, index) for a in self.args
+        ])
+        prefix = [1.0]
+        for v in values[:-1]:
+            prefix.append(prefix[-1] * v)
+        suffix = [1.0]
+        for v in reversed(values[1:]):
+            suffix.append(v * suffix[-1])
+        suffix.reverse()
+        partials = tuple(p * s for p, s in zip(prefix, suffix))
+        return prefix[-1] * values[-1], tape.push(_MUL, inputs, partials)
+
+    def _emit(self, tape):
+        if not self.args:
+            return tape.emit(_ONE)
+        out, *rest = [tape.emit(a) for a in self.args]
+        for b in rest:
+            out = tape.push(_MUL, out, b)
+        return out
+
+    def _source(self, src):
+        if not self.args:
+            return src.emit(_ONE)
+        return src.assign(' * '.join(src.emit(a) for a in self.args))
+
+    @cached_diff
     def diff(self, wrt):
-        deriv = Number(0)
+        prefix = [_ONE]
+        for arg in self.args[:-1]:
+            prefix.append(_product(prefix[-1], arg))
+        suffix = [_ONE]
+        for arg in reversed(self.args[1:]):
+            suffix.append(_product(arg, suffix[-1]))
+        suffix.reverse()
+        deriv = _ZERO
         for i, arg in enumerate(self.args):
-            term = arg.diff(wrt)
-            for j, arg in enumerate(self.args):
-                if j != i:
-                    term = term * arg
+            term = _product(_product(prefix[i], arg.diff(wrt)), suffix[i])
             if i == 0:
                 deriv = term
             else:
@@ -236,10 +588,16 @@ class Multiply(Expression):
 
 class Derivative(Expression):
 
+    __slots__ = ('arg', 'wrt')
+
     def __init__(self, wrt, arg=None):
         self.arg = arg
         self.wrt = wrt
 
+    def __reduce__(self):
+        return type(self), (self.wrt, self.arg)
+
+    @cached_repr
     def __repr__(self):
         wrt_repr = repr(self.wrt)
         if self.arg is None:
@@ -254,53 +612,414 @@ class Derivative(Expression):
             return Derivative(self.wrt, arg=other)
         return Expression.__mul__(self, other)
 
-    def eval(self, **vars):
+    def _eval(self, env):
         if self.arg is None:
             return self
-        return self.arg.diff(self.wrt).eval(**vars)
+        return self.arg.diff(self.wrt)._eval(env)
+
+    def _eval_dual(self, env, slots, n_vars):
+        return self._resolve()._eval_dual(env, slots, n_vars)
 
+    def _record(self, env, slots, tape, index):
+        return self._resolve()._recorded(env, slots, tape, index)
+
+    def _resolve(self):
+        if self.arg is None:
+            raise TypeError('cannot evaluate unapplied derivative')
+        deriv = self.arg.diff(self.wrt)
+        if isinstance(deriv, Derivative):
+            raise TypeError(f'cannot evaluate {deriv}')
+        return deriv
+
+    def _emit(self, tape):
+        if self.arg is None and tape.partial:
+            return tape.const(self)
+        return tape.emit(self._resolve())
+
+    def _source(self, src):
+        return src.emit(self._resolve())
+
+    @cached_diff
     def diff(self, wrt):
         if isinstance(wrt, Tensor):
-            return Tensor([Derivative(wrt=a, arg=self) for a in wrt.args])
+            return Tensor([Derivative(wrt=a, arg=self) for a in wrt])
         return Derivative(wrt, arg=self)
 
 
 class Tensor(Expression):
 
+    __slots__ = ()
+    _kind = 1
+
     def __init__(self, args):
-        self.args = [express(a) for a in args]
-        assert len(self.args) > 0, 'cannot create empty tensor'
-        assert len(set(a.shape for a in self.args)) == 1, \
+        if isinstance(args, np.ndarray) and args.ndim and args.size and all(
+            isinstance(a, Expression) and not isinstance(a, Tensor)
+            for a in args.flat
+        ):
+            self.args = args.copy()
+            return
+        args = [express(a) for a in args]
+        assert len(args) > 0, 'cannot create empty tensor'
+        assert len(set(a.shape for a in args)) == 1, \
             'tensor components must be same shape'
+        self.args = np.empty((len(args),) + args[0].shape, dtype=object)
+        for i, a in enumerate(args):
+            self.args[i] = a.args if isinstance(a, Tensor) else a
 
+    @classmethod
+    def _wrap(cls, args):
+        tensor = object.__new__(cls)
+        tensor.args = args
+        return tensor
+
+    def __reduce__(self):
+        return type(self), (self.args,)
+
+    @cached_repr
     def __repr__(self):
-        return str(self.asarray())
+        return self._format(' ')
+
+    def _format(self, indent):
+        if self.order == 1:
+            return '[' + ' '.join(map(repr, self.args)) + ']'
+        sep = '\n' * (self.order - 1) + indent
+        return '[' + sep.join(a._format(indent + ' ') for a in self) + ']'
 
     def __getitem__(self, idx):
-        return self.args[idx]
+        arg = self.args[idx]
+        if isinstance(arg, np.ndarray):
+            return Tensor._wrap(arg)
+        return arg
 
     def __iter__(self):
-        return iter(self.args)
+        return (self[i] for i in range(len(self)))
 
     def __len__(self):
         return len(self.args)
 
     def asarray(self):
-        return np.asarray([a.asarray() for a in self.args])
+        return self.args.copy()
 
     @property
     def order(self):
-        return self.args[0].order + 1
+        return self.args.ndim
 
     @property
     def shape(self):
-        return (len(self.args),) + self.args[0].shape
+        return self.args.shape
 
-    def eval(self, **vars):
-        value = [a.eval(**vars) for a in self.args]
+    def _pack(self, value):
         if any(isinstance(v, Expression) for v in value):
-            return Tensor(value)
-        return np.array(value)
-
+            args = np.empty(len(value), dtype=object)
+            for i, v in enumerate(value):
+                args[i] = express(v)
+            return Tensor(args.reshape(self.shape))
+        return np.array(value).reshape(self.shape + np.shape(value[0]))
+
+    def _eval(self, env):
+        return self._pack([a._eval(env) for a in self.args.flat])
+
+    def _eval_dual(self, env, slots, n_vars):
+        values, grads = zip(*[
+            a._eval_dual(env, slots, n_vars) for a in self.args.flat
+        ])
+        value = np.array(values).reshape(self.shape)
+        grad = np.array(grads).reshape(self.shape + (n_vars,))
+        return value, grad
+
+    @cached_diff
     def diff(self, wrt):
-        return Tensor([a.diff(wrt) for a in self.args])
+        diff = np.vectorize(lambda a: a.diff(wrt), otypes=[object])
+        return Tensor(diff(self.args))
+
+
+
+def _scalar_add(a, b):
+    if b == 0:
+        return a
+    elif a == 0:
+        return b
+    return Add(a, b)
+
+
+def _tensor_tensor_add(a, b):
+    assert a.shape == b.shape, 'cannot add tensors of different shapes'
+    return Tensor._wrap(a.args + b.args)
+
+
+def _tensor_scalar_add(a, b):
+    if b == 0:
+        return a
+    return Tensor(a.args + b)
+
+
+def _scalar_tensor_add(a, b):
+    if a == 0:
+        return b
+    return Tensor(np.add(a, b.args))
+
+
+def _scalar_sub(a, b):
+    return Add(a, -b)
+
+
+def _tensor_tensor_sub(a, b):
+    assert a.shape == b.shape, 'cannot subtract tensors of different shapes'
+    return Tensor._wrap(a.args - b.args)
+
+
+def _tensor_scalar_sub(a, b):
+    return Tensor(a.args - b)
+
+
+def _scalar_tensor_sub(a, b):
+    return Tensor(np.subtract(a, b.args))
+
+
+def _scalar_mul(a, b):
+    if b == 1:
+        return a
+    elif a == 1:
+        return b
+    elif b == 0:
+        return b
+    elif a == 0:
+        return a
+    return Multiply(a, b)
+
+
+def _tensor_tensor_mul(a, b):
+    raise TypeError('cannot multiply two tensors')
+
+
+def _tensor_scalar_mul(a, b):
+    if b == 1:
+        return a
+    return Tensor(a.args * b)
+
+
+def _scalar_tensor_mul(a, b):
+    if a == 1:
+        return b
+    return Tensor(np.multiply(a, b.args))
+
+
+_ADD_DISPATCH = {
+    (0, 0): _scalar_add,
+    (1, 1): _tensor_tensor_add,
+    (1, 0): _tensor_scalar_add,
+    (0, 1): _scalar_tensor_add,
+}
+
+_SUB_DISPATCH = {
+    (0, 0): _scalar_sub,
+    (1, 1): _tensor_tensor_sub,
+    (1, 0): _tensor_scalar_sub,
+    (0, 1): _scalar_tensor_sub,
+}
+
+_MUL_DISPATCH = {
+    (0, 0): _scalar_mul,
+    (1, 1): _tensor_tensor_mul,
+    (1, 0): _tensor_scalar_mul,
+    (0, 1): _scalar_tensor_mul,
+}
+
+
+_LOAD_VAR, _LOAD_CONST, _ADD, _MUL, _NEG = range(5)
+
+_OPS = {
+    _ADD: np.add,
+    _MUL: np.multiply,
+    _NEG: lambda a, b, out: np.negative(a, out=out),
+}
+
+
+class Tape(object):
+
+    def __init__(self, expr, var_order, partial=False):
+        self.var_order = tuple(var_order)
+        self.partial = partial
+        self.shape = expr.shape
+        self.code = []
+        self.consts = []
+        self.n_nodes = 0
+        self._index = {}
+        self._nodes = []
+        leaves = np.asarray(expr.asarray(), dtype=object).ravel()
+        self.outputs = [self.emit(a) for a in leaves]
+        self._index = self._nodes = None
+
+    def emit(self, expr):
+        expr = express(expr)
+        key = id(expr)
+        if key not in self._index:
+            self._nodes.append(expr)
+            self._index[key] = expr._emit(self)
+        return self._index[key]
+
+    def push(self, op, a, b=-1):
+        out = self.n_nodes
+        self.code.append((op, a, b, out))
+        self.n_nodes += 1
+        return out
+
+    def const(self, value):
+        self.consts.append(value)
+        return self.push(_LOAD_CONST, len(self.consts) - 1)
+
+    def __call__(self, *values):
+        assert len(values) == len(self.var_order), \
+            f'expected {len(self.var_order)} values, got {len(values)}'
+        batch_shape = np.broadcast_shapes(*map(np.shape, values))
+        scratch = np.empty((self.n_nodes,) + batch_shape)
+        flat = scratch.reshape(self.n_nodes, -1)
+        for op, a, b, out in self.code:
+            if op == _LOAD_VAR:
+                scratch[out] = values[a]
+            elif op == _LOAD_CONST:
+                scratch[out] = self.consts[a]
+            else:
+                _OPS[op](flat[a], flat[b], out=flat[out])
+        return flat[self.outputs].reshape(self.shape + batch_shape)[()]
+
+    def run(self, env):
+        values = [None] * self.n_nodes
+        for op, a, b, out in self.code:
+            if op == _LOAD_VAR:
+                values[out] = env[a]
+            elif op == _LOAD_CONST:
+                values[out] = self.consts[a]
+            elif op == _ADD:
+                values[out] = values[a] + values[b]
+            elif op == _MUL:
+                values[out] = values[a] * values[b]
+            else:
+                values[out] = -values[a]
+        return [values[i] for i in self.outputs]
+
+
+class Bound(object):
+
+    def __init__(self, expr, names):
+        self.expr = expr
+        self.names = tuple(names)
+        self.slots = {name: i for i, name in enumerate(self.names)}
+        self._tape = None
+
+    def eval_fast(self, env):
+        if self._tape is None:
+            self._tape = Tape(self.expr, self.names, partial=True)
+        values = self._tape.run(env)
+        if self.expr.shape:
+            return self.expr._pack(values)
+        return values[0]
+
+    def eval_dual(self, env):
+        return self.expr._eval_dual(env, self.slots, len(self.names))
+
+    def eval_tape(self, env):
+        tape = ReverseTape()
+        value, _ = self.expr._recorded(env, self.slots, tape, {})
+        return value, tape.seal()
+
+    def backward(self, tape, seed=1.0):
+        return _backward(
+            tape.ops, tape.offsets, tape.inputs, tape.partials,
+            seed, len(self.names),
+        )
+
+
+class ReverseTape(object):
+
+    def __init__(self):
+        self.ops = []
+        self.offsets = [0]
+        self.inputs = []
+        self.partials = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def push(self, op, inputs=(), partials=()):
+        self.ops.append(op)
+        self.inputs.extend(inputs)
+        self.partials.extend(partials)
+        self.offsets.append(len(self.inputs))
+        return len(self.ops) - 1
+
+    def seal(self):
+        self.ops = np.array(self.ops, dtype=np.intp)
+        self.offsets = np.array(self.offsets, dtype=np.intp)
+        self.inputs = np.array(self.inputs, dtype=np.intp)
+        self.partials = np.array(self.partials, dtype=float)
+        return self
+
+
+def _backward(ops, offsets, inputs, partials, seed, n_vars):
+    adjoint = np.zeros(len(ops))
+    adjoint[-1] = seed
+    grad = np.zeros(n_vars)
+    for out in range(len(ops) - 1, -1, -1):
+        if ops[out] == _LOAD_VAR:
+            grad[inputs[offsets[out]]] += adjoint[out]
+            continue
+        for k in range(offsets[out], offsets[out + 1]):
+            adjoint[inputs[k]] += adjoint[out] * partials[k]
+    return grad
+
+
+if numba is not None:
+    _backward = numba.njit(_backward)
+
+
+class _Source(object):
+
+    def __init__(self, expr, var_names, backend='numba'):
+        if backend not in ('numba', 'numpy'):
+            raise ValueError(f'unknown backend {backend!r}')
+        self.var_names = tuple(var_names)
+        for name in self.var_names:
+            if not name.isidentifier() or iskeyword(name) or name == 'np':
+                raise ValueError(f'{name} is not a valid argument name')
+        self.prefix = '_t'
+        while any(n.startswith(self.prefix) for n in self.var_names):
+            self.prefix = '_' + self.prefix
+        self.n_temps = 0
+        self.lines = []
+        if backend == 'numpy':
+            self.lines += [f'{n} = np.asarray({n})' for n in self.var_names]
+        self._index = {}
+        self._nodes = []
+        leaves = np.asarray(expr.asarray(), dtype=object).ravel()
+        outputs = [self.emit(a) for a in leaves]
+        if not expr.shape:
+            result = outputs[0]
+        elif backend == 'numpy':
+            out = self.assign(
+                f'np.array(np.broadcast_arrays({", ".join(outputs)}))'
+            )
+            result = f'{out}.reshape({expr.shape} + {out}.shape[1:])'
+        else:
+            result = f'np.array([{", ".join(outputs)}]).reshape({expr.shape})'
+        self.lines.append(f'return {result}')
+        self._index = self._nodes = None
+
+    def __str__(self):
+        lines = [f'def _f({", ".join(self.var_names)}):']
+        lines += [f'    {line}' for line in self.lines]
+        return '\n'.join(lines) + '\n'
+
+    def emit(self, expr):
+        expr = express(expr)
+        key = id(expr)
+        if key not in self._index:
+            self._nodes.append(expr)
+            self._index[key] = expr._source(self)
+        return self._index[key]
+
+    def assign(self, code):
+        name = f'{self.prefix}{self.n_temps}'
+        self.n_temps += 1
+        self.lines.append(f'{name} = {code}')
+        return name
@@ -0,0 +1,554 @@
+import copy
+import gc
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+
+from express import express, Expression, Number, Symbol, Tensor
+from express import Add, Multiply, Derivative
+
+
+def test_express_reuses_atoms():
+    assert express('x1') is express('x1')
+    assert express(2.5) is express(2.5)
+    assert express(2) is not express(2.0)
+    x1, x2 = express('x1 x2')
+    assert x1 is express('x1') and x2 is express('x2')
+
+
+def test_zero_and_one_are_interned():
+    assert Number(0) is Number(0)
+    assert Number(1) is Number(1)
+    assert Number(0.0) is not Number(0)
+    assert repr(Number(0.0)) == '0.0'
+    x1, x2 = express('x1 x2')
+    assert x1.diff(x1) is Number(1)
+    assert Number(3).diff(x1) is Number(0)
+
+
+def count_nodes(expr, seen=None):
+    seen = set() if seen is None else seen
+    if id(expr) not in seen:
+        seen.add(id(expr))
+        children = getattr(expr, 'args', None)
+        if children is None:
+            children = [getattr(expr, a, None) for a in ('arg', 'wrt')]
+        for child in children:
+            if child is not None:
+                count_nodes(child, seen)
+    return len(seen)
+
+
+def finite_difference(f, names, values, h=1e-6):
+    grad = []
+    for i in range(len(values)):
+        hi, lo = list(values), list(values)
+        hi[i] += h
+        lo[i] -= h
+        diff = np.subtract(f.eval(**dict(zip(names, hi))),
+                           f.eval(**dict(zip(names, lo))))
+        grad.append(np.asarray(diff, dtype=float) / (2 * h))
+    return np.moveaxis(grad, 0, -1)
+
+
+def test_compile_matches_eval():
+    x1, x2, x3 = express('x1 x2 x3')
+    a = x1 * x2
+    f = a * x3 + -a + Number(2.5) * x1 - x3
+    tape = f.compile(['x1', 'x2', 'x3'])
+    env = dict(x1=1.5, x2=-2.0, x3=0.5)
+    assert np.isclose(tape(1.5, -2.0, 0.5), f.eval(**env))
+    batch = np.linspace(-1.0, 1.0, 5)
+    expected = [f.eval(x1=b, x2=-2.0, x3=0.5) for b in batch]
+    assert np.allclose(tape(batch, -2.0, 0.5), expected)
+    assert f.compile(('x1', 'x2', 'x3')) is tape
+
+
+def test_compile_tensor():
+    x1, x2 = express('x1 x2')
+    F = Tensor([[x1 * x2, x2], [-x1, x1 + Number(3.0)]])
+    tape = F.compile(['x1', 'x2'])
+    expected = np.array(F.eval(x1=2.0, x2=-1.0), dtype=float)
+    assert np.allclose(tape(2.0, -1.0), expected)
+    assert tape(np.zeros(4), np.ones(4)).shape == (2, 2, 4)
+
+
+def test_compile_shares_subexpressions():
+    x1, x2 = express('x1 x2')
+    a = x1 + x2
+    assert (a * a).compile(['x1', 'x2']).n_nodes == 4
+
+
+def test_compile_rejects_unbound_symbols():
+    x1, x2 = express('x1 x2')
+    with pytest.raises(ValueError):
+        (x1 + x2).compile(['x1'])
+    with pytest.raises(TypeError):
+        Derivative(x1, arg=x2).compile(['x1', 'x2'])
+
+
+def test_multiply_diff_matches_product_rule():
+    x1 = express('x1')
+    deriv = Multiply(x1, Number(3.0), x1, x1).diff(x1)
+    assert deriv.eval(x1=2.0) == 36.0
+
+
+def test_multiply_diff_shares_partial_products():
+    xs = express(' '.join(f'x{i}' for i in range(50)))
+    deriv = Multiply(*xs).diff(express('y'))
+    assert count_nodes(deriv) < 10 * len(xs)
+
+
+def test_eval_fast_matches_eval():
+    x1, x2, x3 = express('x1 x2 x3')
+    a = x1 * x2
+    f = a * x3 + -a + Number(2.5) * x1 - x3
+    F = Tensor([f, x1 * x3, -x2])
+    env = dict(x1=1.5, x2=-2.0, x3=0.5)
+    assert np.isclose(f.bind(['x1', 'x2', 'x3']).eval_fast([1.5, -2.0, 0.5]),
+                      f.eval(**env))
+    assert np.allclose(F.bind(['x3', 'x2', 'x1']).eval_fast([0.5, -2.0, 1.5]),
+                       F.eval(**env))
+    assert repr((x1 + x2).bind(['x1']).eval_fast([1.5])) == '(1.5 + x2)'
+
+
+def test_lambdify_matches_eval():
+    x1, x2, x3 = express('x1 x2 x3')
+    a = x1 * x2
+    f = a * x3 + -a + Number(2.5) * x1 - x3
+    F = Tensor([[f, x1 * x3], [-x2, x1 + Number(3.0)]])
+    env = dict(x1=1.5, x2=-2.0, x3=0.5)
+    func = f.lambdify(['x1', 'x2', 'x3'])
+    assert np.isclose(func(1.5, -2.0, 0.5), f.eval(**env))
+    assert f.lambdify(('x1', 'x2', 'x3')) is func
+    expected = np.array(F.eval(**env), dtype=float)
+    assert np.allclose(F.lambdify(['x1', 'x2', 'x3'])(1.5, -2.0, 0.5),
+                       expected)
+
+
+def test_to_source_shares_subexpressions():
+    x1, x2 = express('x1 x2')
+    a = x1 + x2
+    source = (a * a).to_source(['x1', 'x2'])
+    assert source.count('x1 + x2') == 1
+
+
+def test_tensor_stores_object_array():
+    x1, x2, x3, x4 = express('x1 x2 x3 x4')
+    F = Tensor([[x1, x2], [x3, x4]])
+    assert isinstance(F.args, np.ndarray) and F.args.dtype == object
+    assert F.shape == (2, 2) and F.order == 2
+    assert isinstance(F[0], Tensor) and F[0].shape == (2,)
+    assert F[1, 0] is x3
+    assert [repr(row) for row in F.T] == ['[x1 x3]', '[x2 x4]']
+    assert Tensor(np.array([x1, x2], dtype=object)).shape == (2,)
+
+
+def test_tensor_elementwise_ops():
+    x1, x2, x3 = express('x1 x2 x3')
+    u = Tensor([x1, x2])
+    v = Tensor([x2, x3])
+    env = dict(x1=2.0, x2=3.0, x3=5.0)
+    assert np.allclose((u + v).eval(**env), [5.0, 8.0])
+    assert np.allclose((u - v).eval(**env), [-1.0, -2.0])
+    assert np.allclose((u * x3).eval(**env), [10.0, 15.0])
+    assert np.allclose((x3 * u + x1).eval(**env), [12.0, 17.0])
+    assert np.allclose((-u).eval(**env), [-2.0, -3.0])
+    assert np.isclose(u.inner(v).eval(**env), 21.0)
+    assert np.allclose(u.outer(v).eval(**env), [[6.0, 10.0], [9.0, 15.0]])
+    assert repr(u.diff(x1)) == '[1 dx2/dx1]'
+
+
+def test_diff_is_memoized():
+    x1, x2, x3 = express('x1 x2 x3')
+    f = x1 * x2 + -x3
+    deriv = f.diff(x1)
+    assert f.diff(x1) is deriv
+    assert f.diff(express('x1')) is deriv
+    assert f.diff(x2) is not deriv
+
+
+def test_eval_dual_matches_finite_differences():
+    x1, x2, x3 = express('x1 x2 x3')
+    a = x1 * x2
+    f = a * x1 + -(a * x3) + Number(2.5) * x3
+    f += Derivative(x1, arg=x1 * x1 * Number(3.0))
+    F = Tensor([[f, x1 * x3], [-x2, x1 + Number(3.0)]])
+    names, values = ['x1', 'x2', 'x3'], [1.5, -2.0, 0.5]
+    for expr in [f, F]:
+        value, grad = expr.bind(names).eval_dual(values)
+        expected = np.asarray(expr.eval(**dict(zip(names, values))), float)
+        assert np.allclose(value, expected)
+        assert np.allclose(grad, finite_difference(expr, names, values))
+
+
+def test_eval_dual_rejects_unbound_symbols():
+    x1, x2 = express('x1 x2')
+    with pytest.raises(ValueError):
+        (x1 * x2).bind(['x1']).eval_dual([1.0])
+
+
+def test_backward_matches_finite_differences():
+    x1, x2, x3 = express('x1 x2 x3')
+    a = x1 * x2
+    f = a * x1 + -(a * x3) + Number(2.5) * x3
+    f += Derivative(x1, arg=x1 * x1 * Number(3.0))
+    names, values = ['x1', 'x2', 'x3'], [1.5, -2.0, 0.5]
+    bound = f.bind(names)
+    value, tape = bound.eval_tape(values)
+    assert np.isclose(value, f.eval(**dict(zip(names, values))))
+    grad = bound.backward(tape)
+    assert np.allclose(grad, finite_difference(f, names, values))
+
+
+def test_eval_tape_records_shared_nodes_once():
+    x1, x2 = express('x1 x2')
+    a = x1 + x2
+    value, tape = (a * a).bind(['x1', 'x2']).eval_tape([2.0, 3.0])
+    assert value == 25.0 and len(tape) == 4
+
+
+def test_nodes_are_hash_consed():
+    x1, x2 = express('x1 x2')
+    assert (x1 + x2) is (x1 + x2)
+    assert (x1 * x2) is (x1 * x2)
+    assert -x1 is -x1
+    assert (x1 + x2) is not (x2 + x1)
+    assert (x1 * x2) is not (x2 * x1)
+
+
+def test_add_and_multiply_are_flattened():
+    x1, x2, x3 = express('x1 x2 x3')
+    assert (x1 + x2 + x3).args == (x1, x2, x3)
+    assert (x1 * (x2 * x3)).args == (x1, x2, x3)
+    assert (x1 + x2 + x3) is (x1 + (x2 + x3))
+    assert repr(x1 * (x2 + x3)) == 'x1(x2 + x3)'
+
+
+def test_constants_are_folded():
+    x1, x2 = express('x1 x2')
+    assert isinstance(Number(2) + Number(3), Number)
+    assert (Number(2) + Number(3)).value == 5
+    assert repr(x1 + Number(2) + x2 + Number(3)) == '(x1 + 5 + x2)'
+    assert repr(Number(2.0) * x1 * Number(3.0)) == '6.0x1'
+    assert x1 * Number(0) is Number(0)
+    assert Multiply(x1, 0, x2) is Number(0)
+    assert x1 * Number(2) * Number(0.5) is x1
+    assert x1 + Number(2) + Number(-2) is x1
+    assert (2 * x1).eval(x1=3.0) == 6.0
+
+
+def test_outer_transpose():
+    x1, x2, u1, u2 = express('x1 x2 u1 u2')
+    D = Tensor([Derivative(x1), Derivative(x2)])
+    u = Tensor([u1, u2])
+    grad = D.outer(u).T
+    assert grad.shape == (2, 2)
+    assert repr(grad[0, 1]) == 'du1/dx2'
+    assert repr(grad) == '[[du1/dx1 du1/dx2]\n [du2/dx1 du2/dx2]]'
+    assert repr(grad.T) == repr(D.outer(u))
+
+
+def test_tensor_repr_layout():
+    x1, x2, x3, x4 = express('x1 x2 x3 x4')
+    F = Tensor([[x1, x2], [x3, x4]])
+    assert repr(Tensor([x1, x2])) == '[x1 x2]'
+    assert repr(F) == '[[x1 x2]\n [x3 x4]]'
+    assert repr(Tensor([F, F])) == (
+        '[[[x1 x2]\n  [x3 x4]]\n\n [[x1 x2]\n  [x3 x4]]]'
+    )
+    assert repr(Tensor([F, F])) == str(Tensor([F, F]).asarray())
+    xs = express(' '.join(f'x{i}' for i in range(40)))
+    assert '\n' not in repr(Tensor(xs))
+
+
+def test_nodes_have_no_instance_dict():
+    x1, x2 = express('x1 x2')
+    nodes = [Number(2.5), x1, -x1, x1 + x2, x1 * x2, Derivative(x1, arg=x2),
+             Tensor([x1, x2])]
+    for node in nodes:
+        assert not hasattr(node, '__dict__')
+
+
+def test_matmul_matches_numpy():
+    x1, x2, x3, x4 = express('x1 x2 x3 x4')
+    F = Tensor([[x1, x2], [x3, x4]])
+    v = Tensor([x1, x4])
+    env = dict(x1=1.5, x2=-2.0, x3=0.5, x4=3.0)
+    values = np.array([[1.5, -2.0], [0.5, 3.0]])
+    vec = np.array([1.5, 3.0])
+    assert np.allclose((F @ F).eval(**env), values @ values)
+    assert np.allclose((F @ v).eval(**env), values @ vec)
+    assert np.allclose((v @ F).eval(**env), vec @ values)
+    assert np.isclose((v @ v).eval(**env), vec @ vec)
+    assert repr((F @ F)[0, 1]) == '(x1x2 + x2x4)'
+
+
+def test_lambdify_numpy_backend_matches_eval():
+    x1, x2 = express('x1 x2')
+    f = x1 * x2 + -x1 + Number(2.5) * x2
+    F = Tensor([[f, x1 * x2], [-x2, Number(3.0)]])
+    batch = np.linspace(-1.0, 1.0, 5)
+    func = f.lambdify(['x1', 'x2'], backend='numpy')
+    expected = [f.eval(x1=b, x2=2.0) for b in batch]
+    assert np.allclose(func(batch, 2.0), expected)
+    out = F.lambdify(['x1', 'x2'], backend='numpy')(batch, 2.0)
+    assert out.shape == (2, 2, 5)
+    for i, b in enumerate(batch):
+        expected = np.array(F.eval(x1=b, x2=2.0), dtype=float)
+        assert np.allclose(out[..., i], expected)
+    with pytest.raises(ValueError):
+        f.to_source(['x1', 'x2'], backend='cuda')
+
+
+def test_diff_keeps_implicit_dependence():
+    x1, u1 = express('x1 u1')
+    assert repr(u1.diff(x1)) == 'du1/dx1'
+    assert repr((u1 * u1).diff(x1)) == '(du1/dx1u1 + u1du1/dx1)'
+    assert Number(2.5).diff(x1) is Number(0)
+
+
+def test_operator_dispatch():
+    x1, x2, x3 = express('x1 x2 x3')
+    u = Tensor([x1, x2])
+    env = dict(x1=2.0, x2=3.0, x3=5.0)
+    cases = [
+        (x1 + x3, 7.0), (u + u, [4.0, 6.0]), (u + x3, [7.0, 8.0]),
+        (x3 + u, [7.0, 8.0]), (1 + u, [3.0, 4.0]), (u + 1, [3.0, 4.0]),
+        (x1 - x3, -3.0), (u - u, [0.0, 0.0]), (u - x3, [-3.0, -2.0]),
+        (x3 - u, [3.0, 2.0]), (1 - u, [-1.0, -2.0]), (1 - x1, -1.0),
+        (x1 * x3, 10.0), (u * x3, [10.0, 15.0]), (x3 * u, [10.0, 15.0]),
+        (2 * u, [4.0, 6.0]), (u * 2, [4.0, 6.0]), (2 * x1, 4.0),
+    ]
+    for expr, expected in cases:
+        assert np.allclose(expr.eval(**env), expected)
+    assert x1 + 0 is x1 and 0 + x1 is x1
+    assert x1 * 1 is x1 and 1 * x1 is x1
+    assert u + 0 is u and u * 1 is u and 1 * u is u
+    with pytest.raises(TypeError):
+        u * u
+    with pytest.raises(AssertionError):
+        u + Tensor([x1, x2, x3])
+
+
+def test_repr_is_cached():
+    x1, x2 = express('x1 x2')
+    nodes = [-x1, x1 + x2, x1 * x2, Derivative(x1, arg=x1 * x2),
+             Tensor([x1 * x2, x2])]
+    for node in nodes:
+        text = repr(node)
+        assert node._repr_cache is text
+        assert repr(node) is text
+
+
+def test_eval_does_not_modify_inputs():
+    x1, x2 = express('x1 x2')
+    a = np.array([1.0, 2.0])
+    b = np.array([3.0, 4.0])
+    assert np.allclose((x1 + x2).eval(x1=a, x2=1.0), [2.0, 3.0])
+    assert np.allclose((x1 * x2).eval(x1=a, x2=2.0), [2.0, 4.0])
+    assert np.allclose((x1 + x2).bind(['x1', 'x2']).eval_fast([a, b]),
+                       [4.0, 6.0])
+    assert np.allclose(a, [1.0, 2.0]) and np.allclose(b, [3.0, 4.0])
+
+
+def test_eval_deeply_nested_expression():
+    x1, x2, x3 = express('x1 x2 x3')
+    expr = x1
+    for k in range(300):
+        expr = expr * x2 + x3 * k
+    assert expr.eval(x1=1.0, x2=1.0, x3=0.0) == 1.0
+
+
+def test_copy_and_pickle_number():
+    for value in [2.5, 0, 1]:
+        number = Number(value)
+        for clone in [copy.copy(number), copy.deepcopy(number),
+                      pickle.loads(pickle.dumps(number))]:
+            assert clone.value == value
+    assert copy.deepcopy(Number(0)) is Number(0)
+    assert pickle.loads(pickle.dumps(Number(1))) is Number(1)
+
+
+def test_bind_does_not_leak_between_expressions():
+    x1, x2 = express('x1 x2')
+    bound = (x1 + x2).bind(['x1', 'x2'])
+    (x2 * 2).bind(['x2'])
+    assert bound.eval_fast([1.0, 10.0]) == 11.0
+
+
+def test_eval_fast_does_not_look_up_names():
+
+    class NoLookup(dict):
+        def __getitem__(self, key):
+            raise AssertionError(f'looked up {key}')
+        get = __getitem__
+
+    x1, x2, x3 = express('x1 x2 x3')
+    f = x1 * x2 + -x3
+    F = Tensor([f, x1 * x3])
+    for expr in [f, F]:
+        bound = expr.bind(['x1', 'x2', 'x3'])
+        bound.eval_fast([1.0, 2.0, 3.0])
+        bound.slots = NoLookup(bound.slots)
+        expected = expr.eval(x1=2.0, x2=2.0, x3=3.0)
+        assert np.allclose(bound.eval_fast([2.0, 2.0, 3.0]), expected)
+
+
+def test_source_avoids_name_collisions():
+    a, t = express('a _t0')
+    func = (a * t + a).lambdify(['a', '_t0'])
+    assert func(2.0, 3.0) == 8.0
+    for name in ['np', 'lambda', '1x']:
+        with pytest.raises(ValueError):
+            a.to_source([name])
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numpy'])
+def test_source_non_finite_constants(backend):
+    x1 = express('x1')
+    for c in [np.inf, -np.inf]:
+        assert (x1 + Number(c)).lambdify(['x1'], backend)(1.0) == c
+    assert np.isnan((x1 + Number(np.nan)).lambdify(['x1'], backend)(1.0))
+
+
+def test_tensor_copies_caller_array():
+    x1, x2 = express('x1 x2')
+    args = np.array([x1, x2], dtype=object)
+    u = Tensor(args)
+    args[0] = x2
+    assert u[0] is x1
+
+
+def test_diff_with_respect_to_tensor_is_not_memoized():
+    x1, x2 = express('x1 x2')
+    f = x1 * x2
+    for _ in range(10):
+        assert repr(f.diff(Tensor([x1, x2]))) == (
+            '[(x2 + x1dx2/dx1) (dx1/dx2x2 + x1)]'
+        )
+    for node in [f, x1, x2]:
+        cache = getattr(node, '_diff_cache', None) or {}
+        assert set(cache) <= {'x1', 'x2'}
+
+
+def test_backward_gradient_covers_all_names():
+    x1 = express('x1')
+    bound = (x1 * x1).bind(['x1', 'x2'])
+    _, tape = bound.eval_tape([3.0, 1.0])
+    assert np.allclose(bound.backward(tape), [6.0, 0.0])
+
+
+def test_copy_and_pickle_negative():
+    x1 = express('x1')
+    assert copy.copy(-x1) is -x1
+    for clone in [copy.deepcopy(-x1), pickle.loads(pickle.dumps(-x1))]:
+        assert isinstance(clone, type(-x1)) and repr(clone) == '-x1'
+
+
+def test_copy_and_pickle_add_and_multiply():
+    x1, x2 = express('x1 x2')
+    for expr in [x1 + x2, x1 * x2]:
+        assert copy.copy(expr) is expr
+        for clone in [copy.deepcopy(expr), pickle.loads(pickle.dumps(expr))]:
+            assert type(clone) is type(expr) and repr(clone) == repr(expr)
+    assert not hasattr(Number(0), 'args')
+    assert not hasattr(Number(1), 'args')
+
+
+def test_multiply_diff_size_is_linear():
+    xs = express(' '.join(f'x{i}' for i in range(50)))
+    deriv = Multiply(*xs).diff(express('y'))
+    nodes, stack = {}, [deriv]
+    while stack:
+        node = stack.pop()
+        if id(node) not in nodes and isinstance(node, (Add, Multiply)):
+            nodes[id(node)] = node
+            stack.extend(node.args)
+    assert sum(len(node.args) for node in nodes.values()) < 10 * len(xs)
+
+
+def test_negated_constants_are_folded():
+    x1 = express('x1')
+    assert isinstance(-Number(2), Number) and (-Number(2)).value == -2
+    assert (express(3) - express(2)).value == 1
+    assert repr(x1 - express(2)) == '(x1 + -2)'
+    assert -Number(0) is Number(0)
+
+
+def test_diff_products_are_interned_by_factors():
+    p1, p2, p3, p4 = express('p1 p2 p3 p4')
+    prod = p1 * p2 * p3
+    assert (p1 * p2 * p3 * p4).diff(p4).args[-1] is prod
+    q1, q2, q3, q4 = express('q1 q2 q3 q4')
+    term = (q1 * q2 * q3 * q4).diff(q4).args[-1]
+    assert term is q1 * q2 * q3
+    assert term is q1 * (q2 * q3)
+    assert repr(term) == 'q1q2q3'
+
+
+def test_lambdify_is_memoized_on_the_node(monkeypatch):
+    x1, x2 = express('x1 x2')
+    f = x1 * x2 + -x1
+    func = f.lambdify(['x1', 'x2'])
+    numpy_func = f.lambdify(['x1', 'x2'], backend='numpy')
+    monkeypatch.setattr(Expression, 'to_source', None)
+    assert f.lambdify(['x1', 'x2']) is func
+    assert f.lambdify(('x1', 'x2'), 'numpy') is numpy_func
+
+
+def test_tensor_rejects_zero_dimensional_arrays():
+    x1 = express('x1')
+    with pytest.raises(TypeError):
+        Tensor(np.array(x1, dtype=object))
+    with pytest.raises(AssertionError):
+        Tensor(np.empty((0,), dtype=object))
+
+
+def test_inner_requires_equal_shapes():
+    x1, x2, x3 = express('x1 x2 x3')
+    with pytest.raises(AssertionError):
+        Tensor([x1]).inner(Tensor([x1, x2, x3]))
+    with pytest.raises(AssertionError):
+        Tensor([x1, x2, x3]).inner(Tensor([x1]))
+
+
+def test_diff_cache_does_not_keep_wrt_alive():
+    u = express('u_cached')
+    refs = []
+    for i in range(100):
+        wrt = Symbol(f'tmp{i}')
+        refs.append(weakref.ref(wrt))
+        assert repr(u.diff(wrt)) == f'du_cached/dtmp{i}'
+    del wrt
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+    assert len(u._diff_cache) == 0
+
+
+def test_copy_and_pickle_drop_caches():
+    x1, x2 = express('x1 x2')
+    f = x1 * x2 + -x1
+    deriv = f.diff(x1)
+    repr(f)
+    f.compile(['x1', 'x2'])
+    f.lambdify(['x1', 'x2'])
+    for clone in [copy.deepcopy(f), pickle.loads(pickle.dumps(f))]:
+        assert clone is not f and repr(clone) == repr(f)
+        for name in ['_diff_cache', '_tapes', '_lambdas']:
+            assert getattr(clone, name, None) is None
+        x1_clone = clone.args[0].args[0]
+        assert repr(clone.diff(x1_clone)) == repr(deriv)
+
+
+def test_reverse_tape_is_flat_arrays():
+    x1, x2 = express('x1 x2')
+    a = x1 + x2
+    value, tape = (a * a * x1).bind(['x1', 'x2']).eval_tape([2.0, 3.0])
+    assert value == 50.0 and len(tape) == 4
+    assert tape.ops.dtype == np.intp and tape.inputs.dtype == np.intp
+    assert tape.partials.dtype == float
+    assert list(tape.offsets) == [0, 1, 2, 4, 7]
+    assert list(tape.inputs) == [0, 1, 0, 1, 2, 2, 0]